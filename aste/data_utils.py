@@ -1,23 +1,26 @@
-import copy
 import json
-from collections import Counter
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field, asdict, replace
 from enum import Enum
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Set
+from types import SimpleNamespace
+from typing import List, Tuple, Optional, Dict, Set, Iterator
 
 import numpy as np
 import pandas as pd
+from numba import njit
 from pydantic import BaseModel
 from sklearn.metrics import classification_report
 from sklearn.model_selection import train_test_split
 
 from evaluation import TagReader, LinearInstance, nereval
 from parsing import PosTagger
-from utils import count_joins, get_simple_stats
+from utils import count_joins, get_simple_stats, FlexiModel
 
 RawTriple = Tuple[List[int], List[int], int]
 RawEntity = Tuple[List[int], str]
 Span = Tuple[int, int]
+TRIPLE_SOA_KEYS = ("o_start", "o_end", "t_start", "t_end", "label")
 
 
 class SplitEnum(str, Enum):
@@ -35,18 +38,24 @@ class LabelEnum(str, Enum):
 
     @classmethod
     def as_list(cls):
-        return [cls.neutral, cls.positive, cls.negative]
+        return list(LABELS_BY_INDEX)
 
     @classmethod
     def i_to_label(cls, i: int):
-        return cls.as_list()[i]
+        return LABELS_BY_INDEX[i]
 
     @classmethod
     def label_to_i(cls, label) -> int:
-        return cls.as_list().index(label)
+        return LABEL_TO_INDEX[label]
 
 
-class Entity(BaseModel):
+# Polarity index order used by the raw triples: 0 neu, 1 pos, 2 neg
+LABELS_BY_INDEX = (LabelEnum.neutral, LabelEnum.positive, LabelEnum.negative)
+LABEL_TO_INDEX = {label: i for i, label in enumerate(LABELS_BY_INDEX)}
+
+
+@dataclass
+class Entity:
     start: int
     end: int
     ent_type: str
@@ -73,20 +82,18 @@ class Entity(BaseModel):
         return f"{ent} ({self.ent_type})"
 
 
-class SentimentTriple(BaseModel):
+@dataclass
+class SentimentTriple:
     o_start: int
     o_end: int
     t_start: int
     t_end: int
     label: LabelEnum
 
-    @property
-    def opinion(self) -> Tuple[int, int]:
-        return self.o_start, self.o_end
-
-    @property
-    def target(self) -> Tuple[int, int]:
-        return self.t_start, self.t_end
+    def __post_init__(self):
+        # Span tuples are plain attributes (not fields) so asdict/repr match the raw triple
+        self.opinion = (self.o_start, self.o_end)
+        self.target = (self.t_start, self.t_end)
 
     @classmethod
     def from_raw_triple(cls, x: RawTriple):
@@ -111,6 +118,35 @@ class SentimentTriple(BaseModel):
         return f"{opinion}-{target} ({self.label})"
 
 
+def span_midpoints(spans: List[Span]) -> np.ndarray:
+    # Doubled midpoints (start + end) written straight into an int32 buffer
+    pos = np.empty(len(spans), dtype=np.int32)
+    for i, (start, end) in enumerate(spans):
+        pos[i] = start + end
+    return pos
+
+
+@njit(cache=True)
+def pair_argmins(pos_o: np.ndarray, pos_t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Row and column argmin of |pos_o[i] - pos_t[j]| without materializing the distance matrix,
+    # ties resolve to the lowest index like np.argmin
+    n, m = len(pos_o), len(pos_t)
+    closest_t = np.zeros(n, dtype=np.int32)
+    closest_o = np.zeros(m, dtype=np.int32)
+    best_o = np.full(m, np.iinfo(np.int32).max, dtype=np.int32)
+    for i in range(n):
+        best = np.iinfo(np.int32).max
+        for j in range(m):
+            d = abs(pos_o[i] - pos_t[j])
+            if d < best:
+                best = d
+                closest_t[i] = j
+            if d < best_o[j]:
+                best_o[j] = d
+                closest_o[j] = i
+    return closest_t, closest_o
+
+
 class TripleHeuristic(BaseModel):
     @staticmethod
     def run(
@@ -119,17 +155,18 @@ class TripleHeuristic(BaseModel):
         # For each target, pair with the closest opinion (and vice versa)
         spans_o = list(opinion_to_label.keys())
         spans_t = list(target_to_label.keys())
-        pos_o = np.expand_dims(np.array(spans_o).mean(axis=-1), axis=1)
-        pos_t = np.expand_dims(np.array(spans_t).mean(axis=-1), axis=0)
-        dists = np.absolute(pos_o - pos_t)
+        if not spans_o or not spans_t:
+            return []
+        # Span midpoints doubled (start + end) to stay integral, argmin is unaffected
+        pos_o = span_midpoints(spans_o)
+        pos_t = span_midpoints(spans_t)
         raw_triples: Set[Tuple[int, int, LabelEnum]] = set()
 
-        closest = np.argmin(dists, axis=1)
+        closest_t, closest_o = pair_argmins(pos_o, pos_t)
         for i, span in enumerate(spans_o):
-            raw_triples.add((i, int(closest[i]), opinion_to_label[span]))
-        closest = np.argmin(dists, axis=0)
+            raw_triples.add((i, int(closest_t[i]), opinion_to_label[span]))
         for i, span in enumerate(spans_t):
-            raw_triples.add((int(closest[i]), i, target_to_label[span]))
+            raw_triples.add((int(closest_o[i]), i, target_to_label[span]))
 
         triples = []
         for i, j, label in raw_triples:
@@ -141,14 +178,15 @@ class TripleHeuristic(BaseModel):
         return triples
 
 
-class Sentence(BaseModel):
+@dataclass
+class Sentence:
     tokens: List[str]
     entities: List[Entity]
     weight: int
     id: int
     is_labeled: bool
     triples: List[SentimentTriple]
-    spans: List[Tuple[int, int, LabelEnum]] = []
+    spans: List[Tuple[int, int, LabelEnum]] = field(default_factory=list)
 
     def extract_spans(self) -> List[Tuple[int, int, str]]:
         spans = []
@@ -158,7 +196,7 @@ class Sentence(BaseModel):
         return spans
 
     @classmethod
-    def from_instance(cls, x: LinearInstance):
+    def from_instance(cls, x: LinearInstance, validate: bool = False):
         sentence = cls(
             tokens=x.input,
             weight=x.weight,
@@ -167,7 +205,8 @@ class Sentence(BaseModel):
             triples=[SentimentTriple.from_raw_triple(o) for o in x.output[1]],
             is_labeled=x.is_labeled,
         )
-        assert vars(x) == vars(sentence.to_instance())
+        if validate:
+            assert vars(x) == vars(sentence.to_instance())
         return sentence
 
     def to_instance(self) -> LinearInstance:
@@ -186,50 +225,84 @@ class Sentence(BaseModel):
         return " ".join(tokens)
 
 
-class Data(BaseModel):
+class Data(FlexiModel):
     root: Path
     data_split: SplitEnum
     sentences: Optional[List[Sentence]]
     num_instances: int = -1
     opinion_offset: int = 3  # Refer: jet_o.py
     is_labeled: bool = False
+    lazy: bool = False  # Stream sentences from disk instead of loading them all into memory
+
+    def get_path(self) -> Path:
+        # Lazy data reads {split}.jsonl (one sentence per line) when present, since it can be
+        # streamed line by line. Otherwise, and always when not lazy, {split}.json is used
+        path = self.root / f"{self.data_split}.jsonl"
+        if not (self.lazy and path.exists()):
+            path = self.root / f"{self.data_split}.json"
+        return path
+
+    def iter_instances(self, verbose: bool = True) -> Iterator[LinearInstance]:
+        return TagReader.iter_inst(
+            file=self.get_path(),
+            is_labeled=self.is_labeled,
+            number=self.num_instances,
+            opinion_offset=self.opinion_offset,
+            verbose=verbose,
+        )
+
+    def iter_sentences(self) -> Iterator[Sentence]:
+        # Lazy data is re-read from disk on every pass, so single-pass analyzers need not hold
+        # every sentence. The reader summary is only printed by load()
+        if self.sentences is None and not self.lazy:
+            self.load()
+        if self.sentences is not None:
+            yield from self.sentences
+            return
+        for x in self.iter_instances(verbose=False):
+            yield Sentence.from_instance(x, validate=False)
 
     def load(self):
         if self.sentences is None:
-            path = self.root / f"{self.data_split}.json"
-            instances = TagReader.read_inst(
-                file=path,
-                is_labeled=self.is_labeled,
-                number=self.num_instances,
-                opinion_offset=self.opinion_offset,
-            )
-            self.sentences = [Sentence.from_instance(x) for x in instances]
+            instances = self.iter_instances()
+            self.sentences = [Sentence.from_instance(x, validate=False) for x in instances]
 
     def analyze_spans(self):
         print("\nHow often is target closer to opinion than any invalid target?")
         records = []
-        for s in self.sentences:
-            valid_pairs = set([(a.opinion, a.target) for a in s.triples])
+        for s in self.iter_sentences():
+            if not s.triples:
+                continue
+            valid_targets: Dict[Span, Set[Span]] = {}
             for a in s.triples:
-                closest = None
-                for b in s.triples:
-                    dist_a = abs(np.mean(a.opinion) - np.mean(a.target))
-                    dist_b = abs(np.mean(a.opinion) - np.mean(b.target))
-                    if dist_b <= dist_a and (a.opinion, b.target) not in valid_pairs:
-                        closest = b.target
+                valid_targets.setdefault(a.opinion, set()).add(a.target)
+            targets = [b.target for b in s.triples]
+            opi = np.array([a.o_start + a.o_end for a in s.triples])
+            tgt = np.array([a.t_start + a.t_end for a in s.triples])
+            dist = np.abs(opi[:, None] - tgt[None, :])
+            closer = dist <= np.diag(dist)[:, None]
+            valid_mask = np.array(
+                [[t in valid_targets[a.opinion] for t in targets] for a in s.triples]
+            )
+            # Take the last matching target to keep the original scan order
+            candidates = (closer & ~valid_mask)[:, ::-1]
+            has_closer = candidates.any(axis=1)
+            last_closer = len(s.triples) - 1 - np.argmax(candidates, axis=1)
+
+            for i, a in enumerate(s.triples):
+                closest = s.triples[last_closer[i]].target if has_closer[i] else None
 
                 spans = [a.opinion, a.target]
                 if closest is not None:
                     spans.append(closest)
 
-                tokens = list(s.tokens)
-                for start, end in spans:
-                    tokens[start] = "[" + tokens[start]
-                    tokens[end] = tokens[end] + "]"
-
-                start = min([s[0] for s in spans])
-                end = max([s[1] for s in spans])
-                tokens = tokens[start: end + 1]
+                # Only copy the window covering the spans, then bracket relative to it
+                start = min([x[0] for x in spans])
+                end = max([x[1] for x in spans])
+                tokens = s.tokens[start: end + 1]
+                for x_start, x_end in spans:
+                    tokens[x_start - start] = "[" + tokens[x_start - start]
+                    tokens[x_end - start] = tokens[x_end - start] + "]"
 
                 records.append(dict(is_closest=closest is None, text=" ".join(tokens)))
         df = pd.DataFrame(records)
@@ -243,7 +316,7 @@ class Data(BaseModel):
         total_targets = 0
         total_opinions = 0
 
-        for s in self.sentences:
+        for s in self.iter_sentences():
             targets = set([t.target for t in s.triples])
             opinions = set([t.opinion for t in s.triples])
             total_targets += len(targets)
@@ -260,21 +333,21 @@ class Data(BaseModel):
 
     def analyze_tag_counts(self):
         print("\nHow many tokens are target/opinion/none?")
-        record = []
-        for s in self.sentences:
-            tags = [str(None) for _ in s.tokens]
+        names = [str(None), "Opinion", "Target"]
+        counts = np.zeros(len(names), dtype=np.int64)
+        for s in self.iter_sentences():
+            tags = np.zeros(len(s.tokens), dtype=np.int8)
             for t in s.triples:
-                for i in range(t.o_start, t.o_end + 1):
-                    tags[i] = "Opinion"
-                for i in range(t.t_start, t.t_end + 1):
-                    tags[i] = "Target"
-            record.extend(tags)
-        print({k: v / len(record) for k, v in Counter(record).items()})
+                tags[t.o_start: t.o_end + 1] = 1
+                tags[t.t_start: t.t_end + 1] = 2
+            counts += np.bincount(tags, minlength=len(names))
+        total = int(counts.sum())
+        print({k: int(v) / total for k, v in zip(names, counts) if v})
 
     def analyze_span_distance(self):
         print("\nHow far is the target/opinion from each other on average?")
         distances = []
-        for s in self.sentences:
+        for s in self.iter_sentences():
             for t in s.triples:
                 x_opinion = (t.o_start + t.o_end) / 2
                 x_target = (t.t_start + t.t_end) / 2
@@ -283,13 +356,16 @@ class Data(BaseModel):
 
     def analyze_opinion_labels(self):
         print("\nFor opinion/target how often is it associated with only 1 polarity?")
-        for key in ["opinion", "target"]:
-            records = []
-            for s in self.sentences:
+        keys = ["opinion", "target"]
+        key_to_records: Dict[str, List[int]] = {key: [] for key in keys}
+        for s in self.iter_sentences():
+            for key in keys:
                 term_to_labels: Dict[Tuple[int, int], List[LabelEnum]] = {}
                 for t in s.triples:
                     term_to_labels.setdefault(getattr(t, key), []).append(t.label)
-                records.extend([len(set(labels)) for labels in term_to_labels.values()])
+                key_to_records[key].extend([len(set(labels)) for labels in term_to_labels.values()])
+        for key in keys:
+            records = key_to_records[key]
             is_single_label = [n == 1 for n in records]
             print(
                 dict(
@@ -301,17 +377,34 @@ class Data(BaseModel):
 
     def analyze_tag_score(self):
         print("\nIf have all target and opinion terms (unpaired), what is max f_score?")
-        pred = copy.deepcopy(self.sentences)
-        for s in pred:
+        self.load()  # Needs random access, so lazy data is loaded in full
+        pred = []
+        for s in self.sentences:
             target_to_label = {t.target: t.label for t in s.triples}
             opinion_to_label = {t.opinion: t.label for t in s.triples}
-            s.triples = TripleHeuristic().run(opinion_to_label, target_to_label)
+            # Shallow copy: tokens and entities are shared with gold but never mutated
+            triples = TripleHeuristic().run(opinion_to_label, target_to_label)
+            pred.append(replace(s, triples=triples))
 
         analyzer = ResultAnalyzer()
         analyzer.run(pred, gold=self.sentences, print_limit=0)
 
+    @staticmethod
+    def extract_pos_patterns(
+            sents: List[Sentence], tags_list: List[List[str]]
+    ) -> Set[Tuple[str, ...]]:
+        patterns: Set[Tuple[str, ...]] = set()
+        for s, tags in zip(sents, tags_list):
+            assert len(s.tokens) == len(tags)
+            patterns.update(
+                tuple(tags[min(t.t_start, t.o_start): max(t.t_end, t.o_end) + 1])
+                for t in s.triples
+            )
+        return patterns
+
     def analyze_pos_patterns(self):
         print("\nCan we use POS patterns to extract triples?")
+        self.load()  # Needs random access, so lazy data is loaded in full
         sents = self.sentences[:1000]
         tagger = PosTagger()
         s: Sentence
@@ -320,25 +413,8 @@ class Data(BaseModel):
         s_train, s_dev, tags_train, tags_dev = train_test_split(
             sents, tags, test_size=0.2, random_state=42
         )
-        patterns: Set[Tuple[str, ...]] = set()
-        for s, tags in zip(s_train, tags_train):
-            for t in s.triples:
-                start = min(t.t_start, t.o_start)
-                end = max(t.t_end, t.o_end)
-                assert len(s.tokens) == len(tags)
-                _tokens = s.tokens[start: end + 1]
-                _tags = tags[start: end + 1]
-                patterns.add(tuple(_tags))
-
-        patterns_dev: Set[Tuple[str, ...]] = set()
-        for s, tags in zip(s_dev, tags_dev):
-            for t in s.triples:
-                start = min(t.t_start, t.o_start)
-                end = max(t.t_end, t.o_end)
-                assert len(s.tokens) == len(tags)
-                _tokens = s.tokens[start: end + 1]
-                _tags = tags[start: end + 1]
-                patterns_dev.add(tuple(_tags))
+        patterns = self.extract_pos_patterns(s_train, tags_train)
+        patterns_dev = self.extract_pos_patterns(s_dev, tags_dev)
 
         print(
             dict(
@@ -352,7 +428,7 @@ class Data(BaseModel):
     def analyze_ner(self):
         print("\n How many opinion/target per sentence?")
         num_o, num_t = [], []
-        for s in self.sentences:
+        for s in self.iter_sentences():
             opinions, targets = set(), set()
             for t in s.triples:
                 opinions.add((t.o_start, t.o_end))
@@ -363,50 +439,61 @@ class Data(BaseModel):
             dict(
                 num_o=get_simple_stats(num_o),
                 num_t=get_simple_stats(num_t),
-                sentences=len(self.sentences),
+                sentences=len(num_o),
             )
         )
 
     def analyze_direction(self):
         print("\n For targets, is opinion offset always positive/negative/both?")
-        records = []
-        for s in self.sentences:
-            span_to_offsets = {}
-            for t in s.triples:
-                off = np.mean(t.target) - np.mean(t.opinion)
-                span_to_offsets.setdefault(t.opinion, []).append(off)
-            for span, offsets in span_to_offsets.items():
-                labels = [
-                    LabelEnum.positive if off > 0 else LabelEnum.negative
-                    for off in offsets
-                ]
-                lab = labels[0] if len(set(labels)) == 1 else LabelEnum.neutral
-                records.append(
-                    dict(
-                        span=" ".join(s.tokens[span[0]: span[1] + 1]),
-                        text=s.as_text(),
-                        offsets=lab,
-                    )
-                )
-        df = pd.DataFrame(records)
+        self.load()  # Needs random access, so lazy data is loaded in full
+        soa = self.get_triples_soa()
+        sent_ids = np.repeat(
+            np.arange(len(self.sentences)), [len(s.triples) for s in self.sentences]
+        )
+        off = (soa.t_start + soa.t_end) - (soa.o_start + soa.o_end)
+        df = pd.DataFrame(
+            dict(sid=sent_ids, o_start=soa.o_start, o_end=soa.o_end, sign=np.where(off > 0, 1, -1))
+        )
+        groups = df.groupby(["sid", "o_start", "o_end"], sort=False)["sign"]
+        df = groups.agg(["nunique", "first"]).reset_index()
+        sign_to_label = {1: LabelEnum.positive, -1: LabelEnum.negative, 0: LabelEnum.neutral}
+        df["offsets"] = np.where(df["nunique"] == 1, df["first"], 0)
+        df["offsets"] = df["offsets"].map(sign_to_label)
         print(df["offsets"].value_counts(normalize=True))
-        df = df[df["offsets"] == LabelEnum.neutral].drop(columns=["offsets"])
+
+        df = df[df["offsets"] == LabelEnum.neutral]
+        records = [
+            dict(
+                span=" ".join(self.sentences[i].tokens[start: end + 1]),
+                text=self.sentences[i].as_text(),
+            )
+            for i, start, end in zip(df["sid"], df["o_start"], df["o_end"])
+        ]
+        df = pd.DataFrame(records, index=df.index, columns=["span", "text"])
         with pd.option_context("display.max_colwidth", 999):
             print(df.head())
 
+    def get_triples_soa(self) -> SimpleNamespace:
+        # All triples of the corpus as parallel int32 arrays, built on each call
+        return triples_to_soa([t for s in self.iter_sentences() for t in s.triples])
+
     def analyze(self):
-        triples = [t for s in self.sentences for t in s.triples]
+        soa = self.get_triples_soa()
+        sentence_lengths = [len(s.tokens) for s in self.iter_sentences()]
+        label_counts = np.bincount(soa.label, minlength=len(LABELS_BY_INDEX))
         info = dict(
             root=self.root,
-            sentences=len(self.sentences),
-            sentiments=Counter([t.label for t in triples]),
+            sentences=len(sentence_lengths),
+            sentiments=Counter(
+                {LabelEnum.i_to_label(i): int(n) for i, n in enumerate(label_counts) if n}
+            ),
             target_lengths=get_simple_stats(
-                [abs(t.t_start - t.t_end) + 1 for t in triples]
+                (np.abs(soa.t_start - soa.t_end) + 1).tolist()
             ),
             opinion_lengths=get_simple_stats(
-                [abs(t.o_start - t.o_end) + 1 for t in triples]
+                (np.abs(soa.o_start - soa.o_end) + 1).tolist()
             ),
-            sentence_lengths=get_simple_stats([len(s.tokens) for s in self.sentences]),
+            sentence_lengths=get_simple_stats(sentence_lengths),
         )
         for k, v in info.items():
             print(k, v)
@@ -426,12 +513,59 @@ class Data(BaseModel):
 def merge_data(items: List[Data]) -> Data:
     merged = Data(root=Path(), data_split=items[0].data_split, sentences=[])
     for data in items:
-        data.load()
-        merged.sentences.extend(data.sentences)
+        # Lazy items are streamed into the merged list without being loaded themselves
+        merged.sentences.extend(data.iter_sentences())
     return merged
 
 
-class Result(BaseModel):
+def triples_to_array(triples: List[SentimentTriple]) -> np.ndarray:
+    rows = [
+        (t.o_start, t.o_end, t.t_start, t.t_end, LabelEnum.label_to_i(t.label)) for t in triples
+    ]
+    return np.array(rows, dtype=np.int32).reshape(-1, 5)
+
+
+def triples_to_soa(triples: List[SentimentTriple]) -> SimpleNamespace:
+    columns = triples_to_array(triples).T
+    return SimpleNamespace(
+        **{k: np.ascontiguousarray(c) for k, c in zip(TRIPLE_SOA_KEYS, columns)}
+    )
+
+
+@njit(cache=True)
+def check_overlap(a_start: int, a_end: int, b_start: int, b_end: int) -> bool:
+    return max(a_start, b_start) <= min(a_end, b_end)
+
+
+@njit(cache=True)
+def count_matches(pred: np.ndarray, gold: np.ndarray) -> np.ndarray:
+    # Rows are (o_start, o_end, t_start, t_end, label), counts follow the Result fields:
+    # correct, start_correct, start_end_correct, opinion_correct, target_correct, span_overlap
+    counts = np.zeros(6, dtype=np.int64)
+    for i in range(pred.shape[0]):
+        os, oe, ts, te, label = pred[i, 0], pred[i, 1], pred[i, 2], pred[i, 3], pred[i, 4]
+        for j in range(gold.shape[0]):
+            same_o = os == gold[j, 0] and oe == gold[j, 1]
+            same_t = ts == gold[j, 2] and te == gold[j, 3]
+            if same_o and same_t and label == gold[j, 4]:
+                counts[0] += 1
+            if os == gold[j, 0] and ts == gold[j, 2]:
+                counts[1] += 1
+            if same_o and same_t:
+                counts[2] += 1
+            if same_o:
+                counts[3] += 1
+            if same_t:
+                counts[4] += 1
+            if check_overlap(os, oe, gold[j, 0], gold[j, 1]) and check_overlap(
+                    ts, te, gold[j, 2], gold[j, 3]
+            ):
+                counts[5] += 1
+    return counts
+
+
+@dataclass
+class Result:
     num_sentences: int
     num_pred: int = 0
     num_gold: int = 0
@@ -447,10 +581,6 @@ class Result(BaseModel):
 
 
 class ResultAnalyzer(BaseModel):
-    @staticmethod
-    def check_overlap(a_start: int, a_end: int, b_start: int, b_end: int) -> bool:
-        return (b_start <= a_start <= b_end) or (b_start <= a_end <= b_end)
-
     @staticmethod
     def run_sentence(pred: Sentence, gold: Sentence):
         assert pred.tokens == gold.tokens
@@ -484,40 +614,41 @@ class ResultAnalyzer(BaseModel):
 
     @staticmethod
     def analyze_spans(pred: List[Sentence], gold: List[Sentence]):
-        num_triples_gold, triples_found_o, triples_found_t = 0, set(), set()
-        for label in [LabelEnum.opinion, LabelEnum.target]:
-            num_correct, num_pred, num_gold = 0, 0, 0
-            is_target = {LabelEnum.opinion: False, LabelEnum.target: True}[label]
-            for i, (p, g) in enumerate(zip(pred, gold)):
-                spans_gold = set(g.spans if g.spans else g.extract_spans())
-                spans_pred = set(p.spans if p.spans else p.extract_spans())
-                spans_gold = set([s for s in spans_gold if s[-1] == label])
-                spans_pred = set([s for s in spans_pred if s[-1] == label])
-
-                num_gold += len(spans_gold)
-                num_pred += len(spans_pred)
-                num_correct += len(spans_gold.intersection(spans_pred))
+        labels = [LabelEnum.opinion, LabelEnum.target]
+        num_correct, num_pred, num_gold = Counter(), Counter(), Counter()
+        triples_found: Dict[LabelEnum, Set[tuple]] = {label: set() for label in labels}
+        num_triples_gold = 0
+        for i, (p, g) in enumerate(zip(pred, gold)):
+            gold_by_label: Dict[str, Set[tuple]] = defaultdict(set)
+            pred_by_label: Dict[str, Set[tuple]] = defaultdict(set)
+            for span in g.spans if g.spans else g.extract_spans():
+                gold_by_label[span[-1]].add(tuple(span))
+            for span in p.spans if p.spans else p.extract_spans():
+                pred_by_label[span[-1]].add(tuple(span))
+
+            num_triples_gold += len(g.triples)
+            for label in labels:
+                spans_gold, spans_pred = gold_by_label[label], pred_by_label[label]
+                num_gold[label] += len(spans_gold)
+                num_pred[label] += len(spans_pred)
+                num_correct[label] += len(spans_gold.intersection(spans_pred))
 
                 for t in g.triples:
-                    num_triples_gold += 1
-                    span = (t.target if is_target else t.opinion) + (label,)
+                    span = (t.target if label == LabelEnum.target else t.opinion) + (label,)
                     if span in spans_pred:
-                        t_unique = (i,) + tuple(t.dict().items())
-                        if is_target:
-                            triples_found_t.add(t_unique)
-                        else:
-                            triples_found_o.add(t_unique)
-
-            if num_correct and num_pred and num_gold:
-                p = round(num_correct / num_pred, ndigits=4)
-                r = round(num_correct / num_gold, ndigits=4)
+                        t_unique = (i, t.o_start, t.o_end, t.t_start, t.t_end, t.label)
+                        triples_found[label].add(t_unique)
+
+        for label in labels:
+            if num_correct[label] and num_pred[label] and num_gold[label]:
+                p = round(num_correct[label] / num_pred[label], ndigits=4)
+                r = round(num_correct[label] / num_gold[label], ndigits=4)
                 f = round(2 * p * r / (p + r), ndigits=4)
                 info = dict(label=label, p=p, r=r, f=f)
                 print(json.dumps(info, indent=2))
 
-        assert num_triples_gold % 2 == 0  # Was double-counted above
-        num_triples_gold = num_triples_gold // 2
-        num_triples_pred_ceiling = len(triples_found_o.intersection(triples_found_t))
+        found_o, found_t = triples_found[LabelEnum.opinion], triples_found[LabelEnum.target]
+        num_triples_pred_ceiling = len(found_o.intersection(found_t))
         triples_pred_recall_ceiling = num_triples_pred_ceiling / num_triples_gold
         print("\n What is the upper bound for RE from predicted O & T?")
         print(dict(recall=round(triples_pred_recall_ceiling, ndigits=4)))
@@ -533,28 +664,21 @@ class ResultAnalyzer(BaseModel):
                 cls.run_sentence(pred[i], gold[i])
             r.num_pred += len(pred[i].triples)
             r.num_gold += len(gold[i].triples)
-            for p in pred[i].triples:
-                for g in gold[i].triples:
-                    if p.dict() == g.dict():
-                        r.num_correct += 1
-                    if (p.o_start, p.t_start) == (g.o_start, g.t_start):
-                        r.num_start_correct += 1
-                    if (p.opinion, p.target) == (g.opinion, g.target):
-                        r.num_start_end_correct += 1
-                    if p.opinion == g.opinion:
-                        r.num_opinion_correct += 1
-                    if p.target == g.target:
-                        r.num_target_correct += 1
-                    if cls.check_overlap(*p.opinion, *g.opinion) and cls.check_overlap(
-                            *p.target, *g.target
-                    ):
-                        r.num_span_overlap += 1
+            counts = count_matches(
+                triples_to_array(pred[i].triples), triples_to_array(gold[i].triples)
+            )
+            r.num_correct += int(counts[0])
+            r.num_start_correct += int(counts[1])
+            r.num_start_end_correct += int(counts[2])
+            r.num_opinion_correct += int(counts[3])
+            r.num_target_correct += int(counts[4])
+            r.num_span_overlap += int(counts[5])
 
         e = 1e-9
         r.precision = round(r.num_correct / (r.num_pred + e), 4)
         r.recall = round(r.num_correct / (r.num_gold + e), 4)
         r.f_score = round(2 * r.precision * r.recall / (r.precision + r.recall + e), 3)
-        print(r.json(indent=2))
+        print(json.dumps(asdict(r), indent=2))
         cls.analyze_spans(pred, gold)
 
 
@@ -572,6 +696,17 @@ def test_aste(root="aste/data/triplet_data"):
         print(SentimentTriple.from_raw_triple(instances[0].output[1][0]))
 
 
+def test_check_overlap():
+    assert check_overlap(1, 5, 2, 3)  # a contains b
+    assert check_overlap(2, 3, 1, 5)  # b contains a
+    assert check_overlap(1, 3, 3, 5)
+    assert not check_overlap(1, 2, 3, 5)
+    counts = count_matches(
+        np.array([[1, 5, 0, 0, 1]], dtype=np.int32), np.array([[2, 3, 0, 0, 1]], dtype=np.int32)
+    )
+    assert counts[5] == 1
+
+
 def test_merge(root="aste/data/triplet_data"):
     unmerged = [Data(root=p, data_split=SplitEnum.train) for p in Path(root).iterdir()]
     data = merge_data(unmerged)
@@ -1,5 +1,7 @@
-import json
 from abc import abstractmethod
+from pathlib import Path
+
+import orjson
 
 
 class Instance:
@@ -148,18 +150,32 @@ class TagReader:
     # 0 neu, 1 pos, 2 neg
     label2id_map = {"<START>": 0}
 
+    @staticmethod
+    def iter_records(file):
+        # NDJSON (.jsonl, one sentence per line) is streamed,
+        # otherwise the file holds a single json list
+        if Path(file).suffix == ".jsonl":
+            with open(file, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield orjson.loads(line)
+        else:
+            yield from orjson.loads(Path(file).read_bytes())
+
     @classmethod
     def read_inst(cls, file, is_labeled, number, opinion_offset):
-        insts = []
+        return list(cls.iter_inst(file, is_labeled, number, opinion_offset))
+
+    @classmethod
+    def iter_inst(cls, file, is_labeled, number, opinion_offset, verbose=True):
+        num_insts = 0
         # inputs = []
         # outputs = []
         total_p = 0
         original_p = 0
-        f = open(file, "r", encoding="utf-8")
-        f = json.load(f)
 
         # read AAAI2020 data
-        for line in f:
+        for line in cls.iter_records(file):
             inputs = line['text'].split()  # sentence
             raw_entities = line['entity_list']  # entities
             raw_pairs = line['relation_list']  # triplets
@@ -205,15 +221,16 @@ class TagReader:
             output = (new_raw_entities, new_raw_pairs)
 
             # TODO: 检查output中，new raw pairs 为[]的情况，同时修正新增 new_raw_entities 的问题
-            inst = LinearInstance(len(insts) + 1, 1, inputs, output)
+            num_insts += 1
+            inst = LinearInstance(num_insts, 1, inputs, output)
             inst.set_unlabeled()
-            insts.append(inst)
-            if len(insts) >= number > 0:
+            yield inst
+            if num_insts >= number > 0:
                 break
 
-        print("# of original triplets: ", original_p)
-        print("# of triplets for current setup: ", total_p)
-        return insts
+        if verbose:
+            print("# of original triplets: ", original_p)
+            print("# of triplets for current setup: ", total_p)
 
     @staticmethod
     def ot2bieos_o(ts_tag_sequence):
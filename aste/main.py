@@ -1,6 +1,7 @@
 import json
 import shutil
 import time
+from dataclasses import asdict
 from os import remove
 from pathlib import Path
 from typing import List, Tuple, Optional
@@ -246,7 +247,7 @@ class SpanModelTrainer(BaseModel):
             path_out = self.output_dir / f"sentences_{data_split}_{name}.json"
             print(dict(path_out=path_out))
             with open(path_out, "w") as f:
-                f.write("\n".join([s.json() for s in sents]))
+                f.write("\n".join([json.dumps(asdict(s)) for s in sents]))
 
         scorer = nereval()
         analyzer = ResultAnalyzer()